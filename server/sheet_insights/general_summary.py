@@ -1,5 +1,6 @@
-import json
-from sheet_insights.config import client
+import orjson
+from sheet_insights.config import call_llm_with_retry, get_client
+from sheet_insights.llm_cache import canonical_json, get_or_compute, log_prompt_cache_usage, make_cache_key
 import os
 
 SUMMARY_PROMPT = """
@@ -300,37 +301,58 @@ Given the following JSON object of KPI-wise insights, generate exactly 10 deep a
 
 Return your answer as a **valid JSON list with exactly 10 strings**.
 Return only JSON. No markdown, no prose, no explanations, no bullet points.
+Use compact single-line JSON, with no indentation or extra whitespace.
 
 If there is not enough data, return: ["Not enough data available"].
 """
 
-def generate_general_insights():
+SYSTEM_PROMPT = "You are a helpful business analyst."
+
+STATIC_MESSAGES = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "user", "content": SUMMARY_PROMPT},
+)
+
+def generate_general_insights(data=None, use_cache=True):
     kpi_path = os.path.abspath("results/final_supplier_kpis.json")
     output_path = 'results/General-info.json'
 
-    with open(kpi_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if data is None:
+        with open(kpi_path, "rb") as f:
+            data = orjson.loads(f.read())
+
+    input_text = orjson.dumps(data).decode()
+    deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+
+    def request_general_insights():
+        response = call_llm_with_retry(lambda: get_client().chat.completions.create(
+            model=deployment_name,
+            # Keep the KPI data in its own trailing message so the instruction prefix stays cacheable
+            messages=[
+                *STATIC_MESSAGES,
+                {"role": "user", "content": f"```\n{input_text}\n```"}
+            ],
+            temperature=0.0,
+            # 10 points of 10-15 words each stay well under this
+            max_tokens=600
+        ), "General insights")
+        log_prompt_cache_usage("General insights", response)
 
-    input_text = json.dumps(data, indent=2)
+        reply = response.choices[0].message.content.strip()
 
-    response = client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-        messages=[
-            {"role": "system", "content": "You are a helpful business analyst."},
-            {"role": "user", "content": SUMMARY_PROMPT + f"\n```\n{input_text}\n```"}
-        ],
-        temperature=0.0,
-        max_tokens=1500
-    )
+        try:
+            return orjson.loads(reply)
+        except orjson.JSONDecodeError:
+            with open("general_summary_raw.txt", "w", encoding="utf-8") as f:
+                f.write(reply)
+            return None
 
-    reply = response.choices[0].message.content.strip()
+    # Unparseable replies come back as None and are not cached
+    cache_key = make_cache_key(str(deployment_name), SYSTEM_PROMPT, SUMMARY_PROMPT, canonical_json(data))
+    general = get_or_compute(cache_key, request_general_insights, use_cache=use_cache)
+    if general is None:
+        return []
 
-    try:
-        general = json.loads(reply)
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(general, f, indent=2)
-        return general
-    except json.JSONDecodeError:
-        with open("general_summary_raw.txt", "w", encoding="utf-8") as f:
-            f.write(reply)
-        return []
\ No newline at end of file
+    with open(output_path, "wb") as f:
+        f.write(orjson.dumps(general))
+    return general
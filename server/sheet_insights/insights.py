@@ -1,13 +1,12 @@
-import json
-from sheet_insights.config import client
+import orjson
+from sheet_insights.config import call_llm_with_retry, get_client
+from sheet_insights.llm_cache import canonical_json, get_or_compute, log_prompt_cache_usage, make_cache_key
 from pathlib import Path
 import os
-import time
-import random
 
 
 INSIGHT_PROMPT = """
-You are a senior data analyst. Based on the json file content given in the input, generate exactly five concise insights per company as a raw JSON array of strings.
+You are a senior data analyst. Based on the json file content given in the input, generate exactly five concise insights per company as a JSON object that maps each company name to an array of 5 strings.
 You must be fully accurate with dates, figures, and trends — no assumptions or extrapolations.
 
 Instructions:
@@ -15,7 +14,7 @@ Instructions:
 - Do NOT infer trends beyond June, and do NOT confuse column positions or assume patterns.
 - Each insight must highlight patterns, trends, gaps, or performance observations strictly from the actual data.
 - Use clear, factual, and precise language — avoid vague phrases like "the data shows" or "it can be seen".
-- Do NOT include object wrappers or labels like "insight"; only return a plain JSON array of 5 strings.
+- Use the company names exactly as they appear in the input as the top-level keys; do NOT add any other wrapper or label like "insights".
 
 here's what the input looks like:
 {
@@ -250,9 +249,11 @@ here's what the input looks like:
 As you can see the object is KPI wise and I need the output company wise, every kpi has company as values and every company has months as values and the months have the actual values.
 But i need the output company wise with kpis as its value with each kpi with months and values
 
-Only return the JSON array — no markdown, no formatting, no explanations.
+Only return the JSON object — no markdown, no formatting, no explanations.
+Return it as compact single-line JSON, with no indentation or extra whitespace.
 
 Example output Dummy content:
+{
   "CAM": [
     "Safety accidents peaked in February with 2 incidents, while January, May, and June reported zero accidents.",
     "OK delivery cycles percentage was lowest in April at 54% and highest in May at 80%.",
@@ -267,25 +268,37 @@ Example output Dummy content:
     "The number of trips peaked at 42 in May, compared to 25 in both March and June.",
     "Machine breakdown hours dropped from 4 in March to 0 in June, with the number of machine breakdowns also decreasing from 0.5 to 0 over the same period."
   ],
+  ...
+}
 """
 
 
+SYSTEM_PROMPT = "You are a helpful data analyst. Respond quickly and concisely."
+
+# Built once; every request reuses the same leading messages
+STATIC_MESSAGES = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "user", "content": INSIGHT_PROMPT},
+)
 
 
-def get_insights():
+def get_insights(data=None, use_cache=True):
     """Generate insights for a single sheet with retry logic"""
 
     kpi_path = os.path.abspath("results/final_supplier_kpis.json")
     output_path = 'results/insights.json'
 
-    try:
-        with open(kpi_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error in {kpi_path}: {e}")
-        return None
+    # The upload flow passes the KPI data it just built; only standalone calls read it back
+    if data is None:
+        try:
+            with open(kpi_path, "rb") as f:
+                data = orjson.loads(f.read())
+        except orjson.JSONDecodeError as e:
+            print(f"❌ JSON decode error in {kpi_path}: {e}")
+            return None
     
-    json_data_str = json.dumps(data, ensure_ascii=False, indent=2)
+    # Compact JSON: indentation only costs prompt tokens
+    json_data_str = orjson.dumps(data).decode()
 
 
             
@@ -294,15 +307,26 @@ def get_insights():
         print(f"❌ AZURE_OPENAI_DEPLOYMENT environment variable not set")
         return None
 
-    response = client.chat.completions.create(
-    model=deployment_name,
-    messages=[
-        {"role": "system", "content": "You are a helpful data analyst. Respond quickly and concisely."},
-        {"role": "user", "content": INSIGHT_PROMPT + f"\n```\n{json_data_str}\n```"}
-    ],
-    temperature=0.0,
-    max_tokens=1500,
-    timeout=30
-    )
-    reply = response.choices[0].message.content.strip()
-    return json.loads(reply)
\ No newline at end of file
+    def request_insights():
+        # Static instructions first and the KPI data last, so the prefix is
+        # identical across calls and can be served from Azure's prompt cache
+        response = call_llm_with_retry(lambda: get_client().chat.completions.create(
+            model=deployment_name,
+            messages=[
+                *STATIC_MESSAGES,
+                {"role": "user", "content": f"```\n{json_data_str}\n```"}
+            ],
+            temperature=0.0,
+            max_tokens=1500,
+            # The reply is an object keyed by company; JSON mode guarantees it parses
+            response_format={"type": "json_object"},
+            timeout=30
+        ), "Insights")
+        log_prompt_cache_usage("Insights", response)
+        reply = response.choices[0].message.content.strip()
+        return orjson.loads(reply)
+
+    # temperature=0, so the same model + prompt + KPI data gives the same insights.
+    # Key on the canonical data so re-exports with reordered keys still hit.
+    cache_key = make_cache_key(deployment_name, SYSTEM_PROMPT, INSIGHT_PROMPT, canonical_json(data))
+    return get_or_compute(cache_key, request_insights, use_cache=use_cache)
\ No newline at end of file
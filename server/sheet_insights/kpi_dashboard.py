@@ -1,19 +1,7 @@
-import os
-import json
-import time
+import orjson
 import csv
+import re
 from pathlib import Path
-from openai import AzureOpenAI
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version="2023-07-01-preview",
-    azure_endpoint=os.getenv("AZURE_ENDPOINT")
-)
 
 kpi_map = {
     "Safety- Accident data": "accidents",
@@ -27,8 +15,35 @@ kpi_map = {
     "No of Machines breakdown": "machineBreakdowns"
 }
 
+# Static header of the KPI JSON, shared by every run (treat as read-only)
+GENERATED_ON = "2025-07-30"
+KPI_METADATA = {
+    "unitDescriptions": {
+        "accidents": "Number of safety incidents reported",
+        "productionLossHrs": "Production hours lost due to supplier-caused material shortage",
+        "okDeliveryPercent": "Percentage of OK deliveries based on ACMA standards",
+        "trips": "Number of shipment trips completed per month",
+        "quantityShipped": "Number of parts shipped by the supplier",
+        "partsPerTrip": "Efficiency metric showing avg. parts shipped per trip",
+        "vehicleTAT": "Average vehicle turnaround time at the plant (in hours)",
+        "machineDowntimeHrs": "Machine breakdown time (in hours)",
+        "machineBreakdowns": "Number of machine breakdowns"
+    }
+}
+
+def normalize_kpi_label(label):
+    """Case- and whitespace-insensitive form of a KPI label, so small template edits still match"""
+    return " ".join(label.split()).casefold()
+
+KPI_LOOKUP = {normalize_kpi_label(label): kpi for label, kpi in kpi_map.items()}
+
 ALL_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
 
+UNIT_MARKERS = frozenset(["nos", "hrs", "%"])
+
+# Thousands separators, currency/percent signs and stray whitespace around numbers
+NUMBER_NOISE = re.compile(r'[,$%\s]')
+
 def find_month_data_columns(csv_rows):
     """
     Find the exact column positions where month data should be mapped
@@ -36,53 +51,67 @@ def find_month_data_columns(csv_rows):
     """
     for row in csv_rows:
         if len(row) > 10:  # Ensure row has enough columns
-            # Find unit column (nos, Hrs, %)
-            unit_col_index = -1
-            for i, cell in enumerate(row):
-                if cell.strip().lower() in ['nos', 'hrs', '%']:
-                    unit_col_index = i
-                    break
-            
+            # Find unit column (nos, Hrs, %) and stop at the first match
+            unit_col_index = next(
+                (i for i, cell in enumerate(row) if cell and cell.strip().lower() in UNIT_MARKERS),
+                -1
+            )
+
             if unit_col_index >= 0:
                 # Data starts immediately after unit column (including empty cells for null months)
-                data_start_col = unit_col_index + 1
-                return data_start_col
+                return unit_col_index + 1
     
     return 6  # Default fallback
 
+def parse_cell_value(cell_value):
+    """
+    Convert a single CSV cell into a number, or None for blanks and Excel errors
+    """
+    # Blank cells (e.g. months not reported yet) are the common case, skip the regex for them
+    if not cell_value:
+        return None
+
+    cell_value = NUMBER_NOISE.sub('', cell_value)
+
+    # Handle empty values and Excel errors (#DIV/0!, #N/A, #VALUE!, ...)
+    if not cell_value or cell_value.startswith('#'):
+        return None
+
+    try:
+        return float(cell_value) if '.' in cell_value else int(cell_value)
+    except ValueError:
+        return None
+
 def parse_monthly_data_from_row(row, data_start_col):
     """
     Extract monthly data from a row, preserving null values for empty cells
     """
-    monthly_data = {}
-    
     # Extract up to 12 months of data starting from data_start_col
-    for i, month in enumerate(ALL_MONTHS):
-        col_index = data_start_col + i
-        
-        if col_index < len(row):
-            cell_value = row[col_index].strip()
-            
-            # Handle empty/null values
-            if not cell_value or cell_value == '':
-                monthly_data[month] = None
-            # Handle Excel errors
-            elif cell_value.startswith('#') or cell_value in ['#DIV/0!', '#N/A', '#VALUE!']:
-                monthly_data[month] = None
-            else:
-                try:
-                    # Try to convert to number
-                    if '.' in cell_value:
-                        monthly_data[month] = float(cell_value)
-                    else:
-                        monthly_data[month] = int(cell_value)
-                except ValueError:
-                    monthly_data[month] = None
-        else:
-            monthly_data[month] = None
-    
+    month_cells = row[data_start_col:data_start_col + len(ALL_MONTHS)]
+    monthly_data = {month: parse_cell_value(cell) for month, cell in zip(ALL_MONTHS, month_cells)}
+
+    # Months beyond the end of the row have no data
+    for month in ALL_MONTHS[len(month_cells):]:
+        monthly_data[month] = None
+
     return monthly_data
 
+def write_kpi_csv(final_output, csv_path: Path):
+    """
+    Write the KPI data as long-format rows (metric, company, month, value) for spreadsheet/analytics use
+    """
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["metric", "company", "month", "value"])
+        for metric, suppliers in final_output.items():
+            if metric in ("generatedOn", "kpiMetadata"):
+                continue
+            for supplier, monthly_data in suppliers.items():
+                writer.writerows(
+                    (metric, supplier, month, "" if value is None else value)
+                    for month, value in monthly_data.items()
+                )
+
 def get_all_supplier_kpi_json(csv_folder: Path = Path("results/csv_output"), output_path: Path = Path("results/final_supplier_kpis.json")):
     print(f"🔍 Looking for CSV files in: {csv_folder}")
     print(f"📁 CSV folder exists: {csv_folder.exists()}")
@@ -92,27 +121,10 @@ def get_all_supplier_kpi_json(csv_folder: Path = Path("results/csv_output"), out
         return None
     
     final_output = {
-        "generatedOn": "2025-07-30",
-        "kpiMetadata": {
-            "unitDescriptions": {
-                "accidents": "Number of safety incidents reported",
-                "productionLossHrs": "Production hours lost due to supplier-caused material shortage",
-                "okDeliveryPercent": "Percentage of OK deliveries based on ACMA standards",
-                "trips": "Number of shipment trips completed per month",
-                "quantityShipped": "Number of parts shipped by the supplier",
-                "partsPerTrip": "Efficiency metric showing avg. parts shipped per trip",
-                "vehicleTAT": "Average vehicle turnaround time at the plant (in hours)",
-                "machineDowntimeHrs": "Machine breakdown time (in hours)",
-                "machineBreakdowns": "Number of machine breakdowns"
-            }
-        }
+        "generatedOn": GENERATED_ON,
+        "kpiMetadata": KPI_METADATA
     }
 
-    deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-    if not deployment_name:
-        print("❌ AZURE_OPENAI_DEPLOYMENT environment variable not set")
-        return None
-
     csv_files = list(csv_folder.glob("*.csv"))
     print(f"📊 Found {len(csv_files)} CSV files: {[f.name for f in csv_files]}")
     
@@ -143,33 +155,26 @@ def get_all_supplier_kpi_json(csv_folder: Path = Path("results/csv_output"), out
         data_start_col = find_month_data_columns(csv_rows)
         print(f"📅 Data starts at column {data_start_col} for {supplier_name}")
 
-        # Process each KPI row
-        supplier_kpis = {}
-        
+        # Process each KPI row straight into the KPI -> supplier -> month output
         for row in csv_rows:
             if len(row) < 5:  # Skip rows that are too short
                 continue
                 
             # Check if this row contains a KPI we're interested in
             kpi_name = None
-            for i in range(min(3, len(row))):  # Check first 3 columns for KPI name
-                cell_content = row[i].strip()
-                if cell_content in kpi_map:
-                    kpi_name = kpi_map[cell_content]
+            for cell in row[:3]:  # Check first 3 columns for KPI name
+                if not cell:
+                    continue
+                kpi_name = KPI_LOOKUP.get(normalize_kpi_label(cell))
+                if kpi_name:
                     break
             
             if kpi_name:
                 # Extract monthly data for this KPI
                 monthly_data = parse_monthly_data_from_row(row, data_start_col)
-                supplier_kpis[kpi_name] = monthly_data
+                final_output.setdefault(kpi_name, {})[supplier_name] = monthly_data
                 print(f"  ✓ Extracted {kpi_name}: {sum(1 for v in monthly_data.values() if v is not None)} months of data")
 
-        # Add supplier KPIs to final output
-        for kpi_name, monthly_data in supplier_kpis.items():
-            if kpi_name not in final_output:
-                final_output[kpi_name] = {}
-            final_output[kpi_name][supplier_name] = monthly_data
-
         processed_count += 1
 
     print(f"📊 Successfully processed {processed_count} suppliers")
@@ -177,12 +182,19 @@ def get_all_supplier_kpi_json(csv_folder: Path = Path("results/csv_output"), out
     # Save the output
     try:
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(final_output, f, indent=2)
+        output_path.write_bytes(orjson.dumps(final_output))
         print(f"✅ Saved KPI data to: {output_path}")
     except Exception as e:
         print(f"❌ Failed to save KPI data: {e}")
         return None
 
+    # The CSV copy is optional, a failure here should not lose the JSON result
+    csv_output_path = output_path.with_suffix(".csv")
+    try:
+        write_kpi_csv(final_output, csv_output_path)
+        print(f"✅ Saved KPI CSV to: {csv_output_path}")
+    except Exception as e:
+        print(f"⚠️ Failed to save KPI CSV: {e}")
+
     print(f"🎉 KPI processing completed - {processed_count} suppliers processed")
     return final_output
\ No newline at end of file
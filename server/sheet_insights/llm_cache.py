@@ -0,0 +1,69 @@
+import hashlib
+import orjson
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path("results/insights_cache")
+
+cache_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def make_cache_key(*parts: str) -> str:
+    """Hash everything that determines an LLM reply (model, prompt, input data) into a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def canonical_json(data) -> str:
+    """Serialize data so that key order and whitespace do not change the cache key"""
+    return orjson.dumps(data, option=orjson.OPT_SORT_KEYS).decode()
+
+
+def log_prompt_cache_usage(label: str, response):
+    """Print how many prompt tokens Azure served from its automatic prefix cache"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    print(f"🧾 {label}: {cached_tokens}/{usage.prompt_tokens} prompt tokens from prompt cache")
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        cache_stats[outcome] += 1
+
+
+def get_or_compute(key: str, compute, use_cache: bool = True, cache_dir: Path = CACHE_DIR):
+    """Return the cached result for key, or call compute() and store what it returns"""
+    cache_path = cache_dir / f"{key}.json"
+
+    if use_cache and cache_path.exists():
+        try:
+            result = orjson.loads(cache_path.read_bytes())
+            _count("hits")
+            print(f"⚡ LLM cache hit: {cache_path.name}")
+            return result
+        except (OSError, orjson.JSONDecodeError) as e:
+            print(f"⚠️ Ignoring unreadable cache entry {cache_path}: {e}")
+
+    _count("misses")
+    result = compute()
+
+    # Failed calls return None and should be retried next time
+    if result is not None:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("wb", dir=cache_dir, suffix=".tmp", delete=False) as f:
+                f.write(orjson.dumps(result))
+            os.replace(f.name, cache_path)
+        except OSError as e:
+            print(f"⚠️ Failed to write cache entry {cache_path}: {e}")
+
+    return result
@@ -1,127 +1,279 @@
 import openpyxl
 import csv
+import os
 import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, time
+from functools import lru_cache
+from itertools import islice, repeat
 from pathlib import Path
+from python_calamine import CalamineWorkbook
 
+NON_WORD_CHARS = re.compile(r'[^\w\-_]')
+REPEATED_UNDERSCORES = re.compile(r'_+')
+
+@lru_cache(maxsize=4096)
 def normalize_sheet_name(sheet_name: str) -> str:
     """Consistent sheet name normalization used across the application"""
-    clean_name = re.sub(r'[^\w\-_]', '_', sheet_name.strip())
-    clean_name = re.sub(r'_+', '_', clean_name).strip('_')
+    clean_name = NON_WORD_CHARS.sub('_', sheet_name.strip())
+    clean_name = REPEATED_UNDERSCORES.sub('_', clean_name).strip('_')
     return clean_name
 
-def get_sheet_names(file_path):
+@lru_cache(maxsize=32)
+def _get_sheet_names_cached(file_path, mtime_ns, size):
+    # mtime/size are only part of the cache key, so a re-uploaded file is read again
+    # Same reader and fallback as extraction: calamine only reads the workbook index here
+    workbook = _open_workbook(file_path)
     try:
-        workbook = openpyxl.load_workbook(file_path, read_only=True)
-        names = workbook.sheetnames
+        return tuple(_sheet_names(workbook))
+    finally:
         workbook.close()
+
+def get_sheet_names(file_path):
+    try:
+        stat = os.stat(file_path)
+        names = list(_get_sheet_names_cached(str(file_path), stat.st_mtime_ns, stat.st_size))
         print(f"Found {len(names)} sheets: {names}")
         return names
     except Exception as e:
         print(f"Failed to load sheet names: {e}")
         return []
 
-def is_empty_row(row):
-    return all(cell is None or str(cell).strip() == '' for cell in row)
-
 def has_meaningful_content(row):
-    non_empty_cells = [cell for cell in row if cell is not None and str(cell).strip()]
-    if len(non_empty_cells) < 2:
-        return False
-    formula_only = all(str(cell).startswith('=') for cell in non_empty_cells)
-    return not (formula_only and len(non_empty_cells) < 3)
-
-def find_data_boundaries(sheet, start_row=6):
-    rows = list(sheet.iter_rows(min_row=start_row, values_only=True))
+    # Two non-empty cells make a row meaningful, unless both are formulas, then it takes a third.
+    # Stop at the first cell that settles it instead of collecting every non-empty cell.
+    # Only text cells can be blank or hold a formula, so numbers and dates skip str()/strip().
+    non_empty = 0
+    has_value = False
+    for cell in row:
+        if cell is None or (isinstance(cell, str) and not cell.strip()):
+            continue
+        non_empty += 1
+        if not (isinstance(cell, str) and cell.startswith('=')):
+            has_value = True
+        if non_empty >= 3 or (non_empty == 2 and has_value):
+            return True
+    return False
+
+# Stop reading once this many rows in a row carry no data, read-only sheets
+# often report formatted-but-empty rows all the way down to max_row
+MAX_TRAILING_EMPTY_ROWS = 50
+
+def find_data_boundaries(sheet_rows):
+    rows = []
+    # All-None rows are only counted and put back as () once a later row is stored, so a sheet
+    # without data doesn't hold on to every formatted-but-empty row down to max_row
+    pending_blank_rows = 0
     last_meaningful_row = -1
-    for i, row in enumerate(rows):
+    for i, row in enumerate(sheet_rows):
         if has_meaningful_content(row):
             last_meaningful_row = i
+        elif last_meaningful_row >= 0 and i - last_meaningful_row > MAX_TRAILING_EMPTY_ROWS:
+            break
+        elif all(cell is None for cell in row):
+            pending_blank_rows += 1
+            continue
+        rows.extend(repeat((), pending_blank_rows))
+        pending_blank_rows = 0
+        rows.append(row)
+
+    # Neither slice reaches more than 10 rows past the last stored row
+    rows.extend(repeat((), min(pending_blank_rows, 10)))
     return rows[:last_meaningful_row + 4] if last_meaningful_row >= 0 else rows[:10]
 
+def _open_workbook(file_path):
+    """Open a workbook with calamine (native reader), or openpyxl for files calamine cannot read"""
+    try:
+        return CalamineWorkbook.from_path(str(file_path))
+    except Exception as e:
+        print(f"⚠️ calamine could not open {file_path}, falling back to openpyxl: {e}")
+        # data_only: cached formula results, like calamine, instead of the formula text
+        return openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+
+def _sheet_names(workbook):
+    return workbook.sheet_names if isinstance(workbook, CalamineWorkbook) else workbook.sheetnames
+
+def _calamine_value(value):
+    """Turn a calamine cell value into what openpyxl gives for the same cell"""
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    # Date-only cells come back as date, openpyxl gives a datetime at midnight
+    if type(value) is date:
+        return datetime.combine(value, time())
+    return value
+
+def _iter_sheet_rows(workbook, sheet_name, start_row=1):
+    """Yield the cell values of each row from start_row on, shaped like openpyxl's iter_rows(values_only=True)"""
+    if not isinstance(workbook, CalamineWorkbook):
+        yield from workbook[sheet_name].iter_rows(min_row=start_row, values_only=True)
+        return
+
+    sheet = workbook.get_sheet_by_name(sheet_name)
+    if sheet.start is None:  # Nothing in the sheet
+        return
+
+    # iter_rows() starts at row 1 but drops the empty leading columns, pad those back so columns line up with A
+    leading_cells = (None,) * sheet.start[1]
+
+    # calamine gives cached formula results, '' for empty cells, floats for every number and dates without a time
+    for row in islice(sheet.iter_rows(), start_row - 1, None):
+        yield leading_cells + tuple(map(_calamine_value, row))
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Any cached value, inline string or formula tag means the sheet has something to extract
+CELL_CONTENT_TAG = re.compile(rb'<(?:\w+:)?(?:v|is|f)[\s>/]')
+
+def _sheet_xml_paths(zf):
+    """Map each sheet name to its worksheet XML inside the xlsx zip"""
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship")}
+
+    paths = {}
+    for sheet in ET.fromstring(zf.read("xl/workbook.xml")).iter(f"{MAIN_NS}sheet"):
+        target = targets.get(sheet.get(f"{REL_NS}id"))
+        if target:
+            paths[sheet.get("name")] = target[1:] if target.startswith("/") else f"xl/{target}"
+    return paths
+
+def _sheet_has_content(zf, member):
+    # Data sheets hit a value in the first chunk, only empty ones get inflated to the end
+    tail = b''
+    with zf.open(member) as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            if CELL_CONTENT_TAG.search(tail + chunk):
+                return True
+            tail = chunk[-16:]
+    return False
+
+def _drop_sheets_without_content(file_path, target_sheets):
+    """Skip sheets whose XML has no cell values, checked on the raw zip before any workbook parsing"""
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            xml_paths = {name.strip(): path for name, path in _sheet_xml_paths(zf).items()}
+            empty_sheets = {
+                sheet for sheet in target_sheets
+                if sheet.strip() in xml_paths and not _sheet_has_content(zf, xml_paths[sheet.strip()])
+            }
+    except Exception as e:
+        # Unusual packaging just means no prefilter, the parser still handles every sheet
+        print(f"⚠️ Could not prefilter empty sheets: {e}")
+        return target_sheets
+
+    for sheet in empty_sheets:
+        print(f"⏭️ Skipping sheet without any cell values: '{sheet}'")
+    return [sheet for sheet in target_sheets if sheet not in empty_sheets]
+
+def _sheet_lookup(workbook):
+    """Map exact and whitespace-stripped sheet names to the names actually stored in the workbook"""
+    names = _sheet_names(workbook)
+    lookup = {sheet.strip(): sheet for sheet in names}
+    # An exact name always wins over another sheet that only matches once stripped
+    lookup.update((sheet, sheet) for sheet in names)
+    return lookup
+
+def _extract_sheet(workbook, sheet_name, output_dir, sheet_lookup=None):
+    """Write one sheet of an open workbook to CSV, returning (csv_path, clean_name, actual_sheet_name) or None"""
+    try:
+        print(f"🔄 Processing sheet: '{sheet_name}'")
+
+        # Callers extracting several sheets build the lookup once per workbook
+        if sheet_lookup is None:
+            sheet_lookup = _sheet_lookup(workbook)
+
+        # Prefer the exact name, then fall back to matching without surrounding whitespace
+        actual_sheet_name = sheet_lookup.get(sheet_name) or sheet_lookup.get(sheet_name.strip())
+
+        if not actual_sheet_name:
+            print(f"❌ Sheet '{sheet_name}' not found in workbook")
+            print(f"   Available sheets: {_sheet_names(workbook)}")
+            return None
+
+        # Only worth a line when the whitespace fallback picked a differently named sheet
+        if actual_sheet_name != sheet_name:
+            print(f"   Using actual sheet name: '{actual_sheet_name}'")
+        rows = find_data_boundaries(_iter_sheet_rows(workbook, actual_sheet_name, start_row=6))
+
+        # Clean every cell once and size the table from the non-empty rows in the same pass
+        cleaned_rows = []
+        max_cols = 0
+        for row in rows:
+            cleaned = ['' if cell is None else str(cell).strip() for cell in row]
+            if any(cleaned):
+                max_cols = max(max_cols, len(cleaned))
+            cleaned_rows.append(cleaned)
+
+        if not max_cols:
+            print(f"⚠️ No meaningful content found in sheet: {sheet_name}")
+            return None
+
+        clean_name = normalize_sheet_name(sheet_name)
+        csv_path = output_dir / f"{clean_name}.csv"
+
+        # The cleaned rows are our own lists, pad the short ones in place instead of copying every row
+        for cleaned in cleaned_rows:
+            if len(cleaned) < max_cols:
+                cleaned.extend(repeat('', max_cols - len(cleaned)))
+
+        with open(csv_path, "w", newline="", encoding="utf-8", buffering=1024 * 1024) as f:
+            csv.writer(f).writerows(cleaned_rows)
+
+        print(f"✅ Created CSV: {csv_path}")
+        return csv_path, clean_name, actual_sheet_name
+
+    except Exception as e:
+        print(f"❌ Failed to process sheet {sheet_name}: {e}")
+        return None
+
 def extract_csv(file_path, output_dir, sheets_to_process=None, skip_first_sheet=True):
-    all_sheet_names = get_sheet_names(file_path)
-    if not all_sheet_names:
-        print("❌ No sheets found in Excel file")
+    if sheets_to_process:
+        sheets_to_process = _drop_sheets_without_content(file_path, sheets_to_process)
+        if not sheets_to_process:
+            report_extracted([])
+            return [], {}
+
+    # A sheet parses in a few milliseconds, far less than starting a worker process, so all
+    # sheets are read serially from one open workbook
+    try:
+        workbook = _open_workbook(file_path)
+    except Exception as e:
+        print(f"❌ Failed to open workbook {file_path}: {e}")
         return [], {}
 
-    target_sheets = sheets_to_process if sheets_to_process else (
-        all_sheet_names[1:] if skip_first_sheet else all_sheet_names
-    )
+    try:
+        all_sheet_names = _sheet_names(workbook)
+        if not all_sheet_names:
+            print("❌ No sheets found in Excel file")
+            return [], {}
 
-    print(f"Processing {len(target_sheets)} sheet(s): {target_sheets}")
+        target_sheets = sheets_to_process if sheets_to_process else _drop_sheets_without_content(
+            file_path, all_sheet_names[1:] if skip_first_sheet else all_sheet_names
+        )
 
-    workbook = openpyxl.load_workbook(file_path, read_only=True)
-    csv_paths = []
-    name_mapping = {}
+        print(f"Processing {len(target_sheets)} sheet(s): {target_sheets}")
 
-    # Create a mapping of exact sheet names for better matching
-    exact_sheet_names = {sheet.strip(): sheet for sheet in workbook.sheetnames}
-    
-    for sheet_name in target_sheets:
-        try:
-            print(f"🔄 Processing sheet: '{sheet_name}'")
-            
-            # Try to find the exact sheet in workbook
-            actual_sheet_name = None
-            if sheet_name in workbook.sheetnames:
-                actual_sheet_name = sheet_name
-            elif sheet_name.strip() in exact_sheet_names:
-                actual_sheet_name = exact_sheet_names[sheet_name.strip()]
-            else:
-                # Try to find by stripped comparison
-                for wb_sheet in workbook.sheetnames:
-                    if wb_sheet.strip() == sheet_name.strip():
-                        actual_sheet_name = wb_sheet
-                        break
-            
-            if not actual_sheet_name:
-                print(f"❌ Sheet '{sheet_name}' not found in workbook")
-                print(f"   Available sheets: {workbook.sheetnames}")
-                continue
-                
-            print(f"   Using actual sheet name: '{actual_sheet_name}'")
-            sheet = workbook[actual_sheet_name]
-            
-            
-            rows = find_data_boundaries(sheet, start_row=6)
-            non_empty_rows = [row for row in rows if not is_empty_row(row)]
-            
-            if not non_empty_rows:
-                print(f"⚠️ No meaningful content found in sheet: {sheet_name}")
-                continue
-
-            max_cols = max(len(row) for row in non_empty_rows)
-            clean_name = normalize_sheet_name(sheet_name)
-            csv_path = output_dir / f"{clean_name}.csv"
-
-            with open(csv_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                for row in rows:
-                    padded_row = list(row) + [None] * (max_cols - len(row))
-                    cleaned = [
-                        '' if cell is None or str(cell).strip() == '' else str(cell).strip()
-                        for cell in padded_row
-                    ]
-                    writer.writerow(cleaned)
-
-            csv_paths.append(csv_path)
-            name_mapping[clean_name] = actual_sheet_name  # Use the actual sheet name found
-            print(f"✅ Created CSV: {csv_path}")
-            
-        except KeyError as ke:
-            print(f"❌ Sheet '{sheet_name}' not found in workbook")
-            print(f"   Available sheets: {workbook.sheetnames}")
-            # Try to find a close match
-            available_sheets = workbook.sheetnames
-            close_matches = [s for s in available_sheets if sheet_name.strip() in s or s in sheet_name.strip()]
-            if close_matches:
-                print(f"   Possible matches: {close_matches}")
-            continue
-        except Exception as e:
-            print(f"❌ Failed to process sheet {sheet_name}: {e}")
-            continue
+        csv_paths = []
+        name_mapping = {}
+        sheet_lookup = _sheet_lookup(workbook)
 
-    workbook.close()
+        for sheet_name in target_sheets:
+            result = _extract_sheet(workbook, sheet_name, output_dir, sheet_lookup)
+            if result:
+                csv_path, clean_name, actual_sheet_name = result
+                csv_paths.append(csv_path)
+                name_mapping[clean_name] = actual_sheet_name  # Use the actual sheet name found
+    finally:
+        workbook.close()
+
+    report_extracted(csv_paths)
+    return csv_paths, name_mapping
+
+def report_extracted(csv_paths):
     print(f"📁 Successfully saved {len(csv_paths)} CSV files")
     
     if not csv_paths:
@@ -129,5 +281,3 @@ def extract_csv(file_path, output_dir, sheets_to_process=None, skip_first_sheet=
         print("   - All sheets have no meaningful content")
         print("   - All target sheets were excluded or not found")
         print("   - Processing errors occurred for all sheets")
-    
-    return csv_paths, name_mapping
\ No newline at end of file
@@ -0,0 +1,131 @@
+import re
+import zipfile
+from datetime import date, datetime
+from itertools import chain
+
+import openpyxl
+import pytest
+from openpyxl.utils import get_column_letter
+
+from sheet_insights.parser import _iter_sheet_rows, _open_workbook, extract_csv, find_data_boundaries, get_sheet_names
+from python_calamine import CalamineWorkbook
+
+
+def add_cached_formula_results(path):
+    """openpyxl saves formulas without a result, fill in what Excel would cache for each =<cell>*2"""
+    with zipfile.ZipFile(path) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+
+    def cached(match):
+        row = int(match.group(2))
+        return b"<f>%s%d*2</f><v>%d</v>" % (match.group(1), row, row * 2)
+
+    sheet_xml = "xl/worksheets/sheet1.xml"
+    members[sheet_xml] = re.sub(rb"<f>([A-Z]+)(\d+)\*2</f><v\s*/>", cached, members[sheet_xml])
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def unreadable(file_path):
+    raise ValueError("calamine cannot read this file")
+
+
+def write_workbook(path, first_row, first_col):
+    """One sheet with header text above row 6 and KPI rows from row 6, starting at (first_row, first_col)
+
+    Each KPI row holds text, a number, a date-only cell and a formula with a cached result.
+    """
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Supplier"
+    for row in range(first_row, 6):
+        sheet.cell(row, first_col, f"HEADER row {row}")
+        sheet.cell(row, first_col + 1, "junk")
+    for row in range(max(first_row, 6), 9):
+        sheet.cell(row, first_col, f"KPI {row}")
+        sheet.cell(row, first_col + 1, "nos")
+        sheet.cell(row, first_col + 2, row)
+        sheet.cell(row, first_col + 3, date(2025, 1, row)).number_format = "yyyy-mm-dd"
+        sheet.cell(row, first_col + 4, f"={get_column_letter(first_col + 2)}{row}*2")
+    workbook.save(path)
+    add_cached_formula_results(path)
+
+
+@pytest.mark.parametrize("first_row, first_col", [(1, 1), (3, 2), (8, 3)])
+def test_calamine_rows_line_up_with_openpyxl(tmp_path, monkeypatch, first_row, first_col):
+    path = tmp_path / "offset.xlsx"
+    write_workbook(path, first_row, first_col)
+
+    calamine_workbook = _open_workbook(path)
+    # The openpyxl side is the fallback _open_workbook uses when calamine cannot read a file
+    with monkeypatch.context() as patch:
+        patch.setattr(CalamineWorkbook, "from_path", unreadable)
+        openpyxl_workbook = _open_workbook(path)
+    assert isinstance(calamine_workbook, CalamineWorkbook)
+    assert not isinstance(openpyxl_workbook, CalamineWorkbook)
+
+    try:
+        expected = [
+            row for row in _iter_sheet_rows(openpyxl_workbook, "Supplier", start_row=6)
+            if any(cell is not None for cell in row)
+        ]
+        actual = [
+            row for row in _iter_sheet_rows(calamine_workbook, "Supplier", start_row=6)
+            if any(cell is not None for cell in row)
+        ]
+    finally:
+        openpyxl_workbook.close()
+        calamine_workbook.close()
+
+    assert actual == [row[:len(actual[0])] for row in expected]
+    assert all(row[first_col - 1].startswith("KPI") for row in actual)
+    # Formulas come back as their cached result and date-only cells as openpyxl's datetime
+    kpi_rows = range(max(first_row, 6), 9)
+    assert [row[first_col + 1:first_col + 4] for row in actual[-len(kpi_rows):]] == [
+        (row, datetime(2025, 1, row), row * 2) for row in kpi_rows
+    ]
+
+
+def test_extract_csv_skips_rows_above_start_row(tmp_path):
+    path = tmp_path / "offset.xlsx"
+    write_workbook(path, first_row=3, first_col=2)
+
+    csv_paths, name_mapping = extract_csv(path, tmp_path, sheets_to_process=["Supplier"])
+
+    assert name_mapping == {"Supplier": "Supplier"}
+    lines = csv_paths[0].read_text(encoding="utf-8").splitlines()
+    assert lines[:3] == [
+        ",KPI 6,nos,6,2025-01-06 00:00:00,12",
+        ",KPI 7,nos,7,2025-01-07 00:00:00,14",
+        ",KPI 8,nos,8,2025-01-08 00:00:00,16",
+    ]
+    assert "HEADER" not in csv_paths[0].read_text(encoding="utf-8")
+
+
+def test_find_data_boundaries_does_not_keep_blank_rows_of_a_sheet_without_data():
+    blank_rows = ((None,) * 20 for _ in range(200_000))
+    rows = find_data_boundaries(chain([("Title", None)], blank_rows))
+
+    assert len(rows) == 10
+    assert rows[0] == ("Title", None)
+
+
+def test_find_data_boundaries_keeps_row_positions_before_late_data():
+    header = [("Note only", None, None)]
+    blank_rows = [(None, None, None)] * 40
+    data = [("KPI", "nos", 1), ("KPI", "nos", 2)]
+    rows = find_data_boundaries(header + blank_rows + data + blank_rows)
+
+    assert len(rows) == 1 + 40 + 2 + 3
+    assert rows[0] == ("Note only", None, None)
+    assert rows[41:43] == data
+    assert not any(any(cell is not None for cell in row) for row in rows[1:41] + rows[43:])
+
+
+def test_sheet_names_fall_back_to_openpyxl(tmp_path, monkeypatch):
+    path = tmp_path / "offset.xlsx"
+    write_workbook(path, first_row=1, first_col=1)
+
+    monkeypatch.setattr(CalamineWorkbook, "from_path", unreadable)
+    assert get_sheet_names(path) == ["Supplier"]